@@ -2,36 +2,162 @@ import bpy
 import json
 import os
 import math
+import hashlib
+import time
+
+# =====================================================
+# SETTINGS
+# =====================================================
+json_path = r"C:\OpenPose\opoenpose_video10.json"
+
+# True = zadrži postojeći Stickman_Animation i precrtaj samo frameove/slojeve
+# čiji su se keypointsi (ili pragovi) promijenili od zadnjeg pokretanja;
+# False = obriši scenu i nacrtaj sve ispočetka
+UPDATE_MODE = False
+
+# Ulazi u fingerprint svakog sloja. Nakon SVAKE izmjene koda za crtanje
+# (draw_* funkcije: radijusi, debljine linija, segmenti, uši...) povećaj
+# DRAW_VERSION, inače UPDATE_MODE zadrži stare strokeove na frameovima
+# čiji se keypointsi nisu promijenili
+DRAW_VERSION = 1
+
+# True = crtaj u dijelovima kroz modalni operator (UI ostaje responzivan, ESC prekida);
+# u background modu (blender -b) se uvijek crta odjednom
+BUILD_ASYNC = True
+CHUNK_TIME_BUDGET = 0.05  # sekunde crtanja po jednom timer eventu
+TIMER_INTERVAL = 0.01
+
+CONFIDENCE_THRESHOLD = 0.1
+FACE_CONFIDENCE_THRESHOLD = 0.15
+
+GP_OBJECT_NAME = "Stickman_Animation"
+FINGERPRINT_PROP = "stickman_fingerprints"
+
+# Ne diraj scenu dok prethodno pokretanje još crta (operator iz ranijeg
+# pokretanja skripte ostaje registriran u bpy.types)
+running_operator = getattr(bpy.types, "STICKMAN_OT_build_animation", None)
+if running_operator is not None and getattr(running_operator, "is_running", False):
+    raise Exception("Stickman build is already running - press ESC to cancel it first")
+
+existing_gp = bpy.data.objects.get(GP_OBJECT_NAME)
+incremental = UPDATE_MODE and existing_gp is not None and existing_gp.type == 'GPENCIL'
 
 # =====================================================
 # CLEAN SCENE 
 # =====================================================
 
-for obj in bpy.data.objects:
-    if obj.type == 'GPENCIL':
-        bpy.data.objects.remove(obj, do_unlink=True)
+if not incremental:
+    for obj in bpy.data.objects:
+        if obj.type == 'GPENCIL':
+            bpy.data.objects.remove(obj, do_unlink=True)
 
 
-bpy.ops.object.select_all(action='SELECT')
-bpy.ops.object.delete(use_global=False)
+    bpy.ops.object.select_all(action='SELECT')
+    bpy.ops.object.delete(use_global=False)
 
 
-for gp_data in bpy.data.grease_pencils:
-    bpy.data.grease_pencils.remove(gp_data)
+    for gp_data in bpy.data.grease_pencils:
+        bpy.data.grease_pencils.remove(gp_data)
 
 # =====================================================
-# LOAD JSON
+# LOAD JSON (STREAMING)
 # =====================================================
-json_path = r"C:\OpenPose\opoenpose_video10.json"
+NUMBER_DELIMITERS = " \t\r\n,]}"
+
+class _JSONStream:
+    """Minimalni čitač JSON vrijednosti iz datoteke, dio po dio."""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        chunk = self.f.read(self.chunk_size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+        return bool(chunk)
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf) or not self._fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def take(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Neispravan JSON: očekivan '{char}'")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # Broj je cijeli tek kad iza njega dođe razmak, ',', ']' ili '}'
+                # (inače buffer može završiti npr. s "2." ili "1e")
+                is_number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if (self.eof or not is_number
+                        or (end < len(self.buf) and self.buf[end] in NUMBER_DELIMITERS)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+def _iter_top_level(path, chunk_size=1 << 16):
+    """Vraća (ključ, vrijednost) za vrh JSON objekta; "frames" vraća frame po frame."""
+    with open(path, "r", encoding="utf-8") as f:
+        stream = _JSONStream(f, chunk_size)
+        stream.take("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            key = stream.value()
+            stream.take(":")
+            if key == "frames":
+                stream.take("[")
+                if stream.peek() != "]":
+                    while True:
+                        yield key, stream.value()
+                        if stream.peek() != ",":
+                            break
+                        stream.take(",")
+                stream.take("]")
+            else:
+                yield key, stream.value()
+            if stream.peek() != ",":
+                break
+            stream.take(",")
+        stream.take("}")
+
+def read_animation_metadata(path):
+    """Pročitaj samo metadata, bez učitavanja frameova."""
+    for key, value in _iter_top_level(path):
+        if key == "metadata":
+            return value
+    raise Exception("JSON file has no metadata")
+
+def iter_animation_frames(path):
+    """Vraća frameove jedan po jedan - memorija ne raste s duljinom snimke."""
+    for key, value in _iter_top_level(path):
+        if key == "frames":
+            yield value
+
 if not os.path.exists(json_path):
     raise Exception("JSON file not found")
 
-with open(json_path, "r") as f:
-    data = json.load(f)
+metadata = read_animation_metadata(json_path)
 
-frames = data["frames"]
-connections = data["metadata"]["bone_connections"]
-has_face = data["metadata"].get("has_face_data", False)
+total_frames = metadata["total_frames"]
+connections = metadata["bone_connections"]
+has_face = metadata.get("has_face_data", False)
 
 # =====================================================
 # FACE DEFINITIONS
@@ -44,44 +170,72 @@ FACE_NOSE = ["Face_nose_%d" % i for i in range(9)]  # 0-8: nos
 # CREATE SINGLE GREASE PENCIL OBJECT
 # =====================================================
 
-bpy.ops.object.gpencil_add(type='EMPTY')
-gp = bpy.context.object
-gp.name = "Stickman_Animation"
+if incremental:
+    gp = existing_gp
+else:
+    bpy.ops.object.gpencil_add(type='EMPTY')
+    gp = bpy.context.object
+    gp.name = GP_OBJECT_NAME
+
 
+    while len(gp.data.layers) > 0:
+        gp.data.layers.remove(gp.data.layers[0])
 
-while len(gp.data.layers) > 0:
-    gp.data.layers.remove(gp.data.layers[0])
+def get_or_create_layer(name, color, line_change):
+    """Dohvati sloj po imenu, ili ga stvori ako ne postoji."""
+    layer = gp.data.layers.get(name)
+    if layer is None:
+        layer = gp.data.layers.new(name, set_active=False)
+    layer.color = color
+    layer.line_change = line_change
+    return layer
 
 # Stvori različite slojeve za različite dijelove tijela
-body_layer = gp.data.layers.new("Body", set_active=True)
-head_layer = gp.data.layers.new("Head", set_active=False)  
-face_eyes_layer = gp.data.layers.new("Face_Eyes", set_active=False)
-face_eyebrows_layer = gp.data.layers.new("Face_Eyebrows", set_active=False)
-face_nose_layer = gp.data.layers.new("Face_Nose", set_active=False)
-ears_layer = gp.data.layers.new("Ears", set_active=False)  
-
-
-body_layer.color = (1.0, 0.5, 0.0)  
-head_layer.color = (1.0, 1.0, 1.0) 
-face_eyes_layer.color = (0.0, 0.8, 1.0)  
-face_eyebrows_layer.color = (0.6, 0.4, 0.2)  
-face_nose_layer.color = (1.0, 0.0, 0.0) 
-ears_layer.color = (1.0, 1.0, 1.0)  
-
-# Postavi debljinu linija za svaki sloj (integer vrijednosti)
-body_layer.line_change = 2
-head_layer.line_change = 2  # Debljina linije glave
-face_eyes_layer.line_change = 1
-face_eyebrows_layer.line_change = 1
-face_nose_layer.line_change = 1
-ears_layer.line_change = 1
+# (boja, debljina linije - integer vrijednosti)
+body_layer = get_or_create_layer("Body", (1.0, 0.5, 0.0), 2)
+head_layer = get_or_create_layer("Head", (1.0, 1.0, 1.0), 2)  # Debljina linije glave
+face_eyes_layer = get_or_create_layer("Face_Eyes", (0.0, 0.8, 1.0), 1)
+face_eyebrows_layer = get_or_create_layer("Face_Eyebrows", (0.6, 0.4, 0.2), 1)
+face_nose_layer = get_or_create_layer("Face_Nose", (1.0, 0.0, 0.0), 1)
+ears_layer = get_or_create_layer("Ears", (1.0, 1.0, 1.0), 1)
+gp.data.layers.active = body_layer
+
+# =====================================================
+# FINGERPRINTS (ZA INKREMENTALNO AŽURIRANJE)
+# =====================================================
+BODY_JOINTS = ["Head", "Neck", "RShoulder", "RElbow", "RWrist", "LShoulder", "LElbow",
+               "LWrist", "MidHip", "RHip", "RKnee", "RAnkle", "LHip", "LKnee", "LAnkle"]
+
+# Koji keypointsi utječu na crtež pojedinog sloja
+LAYER_INPUTS = {
+    "Body": (BODY_JOINTS, CONFIDENCE_THRESHOLD),
+    "Head": (["Head", "REye", "LEye"], CONFIDENCE_THRESHOLD),
+    "Face_Eyes": (["REye", "LEye"], CONFIDENCE_THRESHOLD),
+    "Ears": (["Head", "REye", "LEye", "REar", "LEar"], CONFIDENCE_THRESHOLD),
+    "Face_Eyebrows": (FACE_EYEBROWS_LEFT + FACE_EYEBROWS_RIGHT, (has_face, FACE_CONFIDENCE_THRESHOLD)),
+    "Face_Nose": (FACE_NOSE, (has_face, FACE_CONFIDENCE_THRESHOLD)),
+}
+
+def layer_fingerprint(frame_data, layer_name):
+    """Kratki hash ulaza koji određuju sadržaj sloja u jednom frameu."""
+    joints, settings = LAYER_INPUTS[layer_name]
+    kp = frame_data["keypoints"]
+    payload = json.dumps([[kp.get(j) for j in joints], settings, DRAW_VERSION], sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+if incremental and FINGERPRINT_PROP in gp:
+    stored_fingerprints = json.loads(gp[FINGERPRINT_PROP])
+else:
+    stored_fingerprints = {}
 
 # =====================================================
 # TIMELINE
 # =====================================================
-bpy.context.scene.render.fps = data["metadata"].get("fps", 30)
+bpy.context.scene.render.fps = metadata.get("fps", 30)
 bpy.context.scene.frame_start = 1
-bpy.context.scene.frame_end = len(frames)
+# Kod novog crtanja frame_end raste kako se frameovi crtaju, da se već
+# nacrtani dio može odmah pustiti
+bpy.context.scene.frame_end = total_frames if incremental else 1
 
 # =====================================================
 # POMOĆNE FUNKCIJE ZA CRTANJE
@@ -124,18 +278,6 @@ def draw_connected_points(frame, points_list, close_loop=False, line_width=4):
     if close_loop and len(points_list) >= 3:
         draw_line_between_points(frame, points_list[-1], points_list[0], line_width)
 
-def get_or_create_frame(layer, frame_number):
-    """Dohvati frame, ili stvori novi ako ne postoji."""
-    # Provjeri postoji li već frame s tim brojem
-    for existing_frame in layer.frames:
-        if existing_frame.frame_number == frame_number:
-            # Obriši sve strokeove u postojećem frameu
-            existing_frame.strokes.clear()
-            return existing_frame
-    
-    
-    return layer.frames.new(frame_number)
-
 # =====================================================
 # FUNKCIJA ZA CRTANJE VRATA (U BODY_LAYER)
 # =====================================================
@@ -148,7 +290,7 @@ def draw_neck(frame_data, body_frame):
         head = kp["Head"]
         neck = kp["Neck"]
         
-        if head["confidence"] > 0.1 and neck["confidence"] > 0.1:
+        if head["confidence"] > CONFIDENCE_THRESHOLD and neck["confidence"] > CONFIDENCE_THRESHOLD:
             # Crtaj vrat od vrata do glave
             head_x, head_y = head["x"], head["y"]
             neck_x, neck_y = neck["x"], neck["y"]
@@ -170,7 +312,7 @@ def draw_head(frame_data, head_frame):
     kp = frame_data["keypoints"]
     
     # Ako imamo Head točku, koristimo je kao centar glave
-    if "Head" in kp and kp["Head"]["confidence"] > 0.1:
+    if "Head" in kp and kp["Head"]["confidence"] > CONFIDENCE_THRESHOLD:
         head_x = kp["Head"]["x"]
         head_y = kp["Head"]["y"]
         
@@ -179,7 +321,7 @@ def draw_head(frame_data, head_frame):
         
         # Ako imamo oči, možemo prilagoditi veličinu glave
         if "REye" in kp and "LEye" in kp:
-            if kp["REye"]["confidence"] > 0.1 and kp["LEye"]["confidence"] > 0.1:
+            if kp["REye"]["confidence"] > CONFIDENCE_THRESHOLD and kp["LEye"]["confidence"] > CONFIDENCE_THRESHOLD:
                 reye_x, reye_y = kp["REye"]["x"], kp["REye"]["y"]
                 leye_x, leye_y = kp["LEye"]["x"], kp["LEye"]["y"]
                 
@@ -209,12 +351,13 @@ def draw_face_features(frame_data, head_frame, face_eyes_frame,
     kp = frame_data["keypoints"]
     
     # --- CRTANJE OČIJU ---
-    if "REye" in kp and kp["REye"]["confidence"] > 0.1:
+    # (frame None znači da se taj sloj ne precrtava)
+    if face_eyes_frame is not None and "REye" in kp and kp["REye"]["confidence"] > CONFIDENCE_THRESHOLD:
         reye_x = kp["REye"]["x"]
         reye_y = kp["REye"]["y"]
         draw_circle(face_eyes_frame, reye_x, reye_y, radius=0.004, line_width=2)
     
-    if "LEye" in kp and kp["LEye"]["confidence"] > 0.1:
+    if face_eyes_frame is not None and "LEye" in kp and kp["LEye"]["confidence"] > CONFIDENCE_THRESHOLD:
         leye_x = kp["LEye"]["x"]
         leye_y = kp["LEye"]["y"]
         draw_circle(face_eyes_frame, leye_x, leye_y, radius=0.004, line_width=2)
@@ -223,20 +366,20 @@ def draw_face_features(frame_data, head_frame, face_eyes_frame,
     head_x = head_y = None
     head_radius = 0.075
     
-    if "Head" in kp and kp["Head"]["confidence"] > 0.1:
+    if "Head" in kp and kp["Head"]["confidence"] > CONFIDENCE_THRESHOLD:
         head_x = kp["Head"]["x"]
         head_y = kp["Head"]["y"]
         
         # Izračunaj radijus glave
         if "REye" in kp and "LEye" in kp:
-            if kp["REye"]["confidence"] > 0.1 and kp["LEye"]["confidence"] > 0.1:
+            if kp["REye"]["confidence"] > CONFIDENCE_THRESHOLD and kp["LEye"]["confidence"] > CONFIDENCE_THRESHOLD:
                 reye_x, reye_y = kp["REye"]["x"], kp["REye"]["y"]
                 leye_x, leye_y = kp["LEye"]["x"], kp["LEye"]["y"]
                 eye_distance = math.sqrt((reye_x - leye_x)**2 + (reye_y - leye_y)**2)
                 head_radius = min(eye_distance * 1.2, 0.075)
     
     # Desno uho - na desnoj strani glave
-    if "REar" in kp and kp["REar"]["confidence"] > 0.1 and head_x is not None and head_y is not None:
+    if ears_frame is not None and "REar" in kp and kp["REar"]["confidence"] > CONFIDENCE_THRESHOLD and head_x is not None and head_y is not None:
         # Prvo uzmi originalnu poziciju uha iz JSON-a
         ear_x = kp["REar"]["x"]
         ear_y = kp["REar"]["y"]
@@ -290,7 +433,7 @@ def draw_face_features(frame_data, head_frame, face_eyes_frame,
             stroke.points[i].pressure = 1.0
     
     # Lijevo uho - na lijevoj strani glave
-    if "LEar" in kp and kp["LEar"]["confidence"] > 0.1 and head_x is not None and head_y is not None:
+    if ears_frame is not None and "LEar" in kp and kp["LEar"]["confidence"] > CONFIDENCE_THRESHOLD and head_x is not None and head_y is not None:
         # Prvo uzmi originalnu poziciju uha iz JSON-a
         ear_x = kp["LEar"]["x"]
         ear_y = kp["LEar"]["y"]
@@ -347,34 +490,34 @@ def draw_face_features(frame_data, head_frame, face_eyes_frame,
         # Lijeva obrva
         left_eyebrow_points = []
         for face_id in FACE_EYEBROWS_LEFT:
-            if face_id in kp and kp[face_id]["confidence"] > 0.15:
+            if face_id in kp and kp[face_id]["confidence"] > FACE_CONFIDENCE_THRESHOLD:
                 x = kp[face_id]["x"]
                 y = kp[face_id]["y"]
                 left_eyebrow_points.append((x, y, 0))
         
-        if len(left_eyebrow_points) >= 2:
+        if face_eyebrows_frame is not None and len(left_eyebrow_points) >= 2:
             draw_connected_points(face_eyebrows_frame, left_eyebrow_points, close_loop=False, line_width=1)
     
         # Desna obrva
         right_eyebrow_points = []
         for face_id in FACE_EYEBROWS_RIGHT:
-            if face_id in kp and kp[face_id]["confidence"] > 0.15:
+            if face_id in kp and kp[face_id]["confidence"] > FACE_CONFIDENCE_THRESHOLD:
                 x = kp[face_id]["x"]
                 y = kp[face_id]["y"]
                 right_eyebrow_points.append((x, y, 0))
         
-        if len(right_eyebrow_points) >= 2:
+        if face_eyebrows_frame is not None and len(right_eyebrow_points) >= 2:
             draw_connected_points(face_eyebrows_frame, right_eyebrow_points, close_loop=False, line_width=1)
         
         # --- CRTANJE NOSA ---
         nose_points = []
         for face_id in FACE_NOSE:
-            if face_id in kp and kp[face_id]["confidence"] > 0.15:
+            if face_id in kp and kp[face_id]["confidence"] > FACE_CONFIDENCE_THRESHOLD:
                 x = kp[face_id]["x"]
                 y = kp[face_id]["y"]
                 nose_points.append((x, y, 0))
         
-        if len(nose_points) >= 2:
+        if face_nose_frame is not None and len(nose_points) >= 2:
             # Nacrtaj linije između točaka nosa
             for i in range(len(nose_points) - 1):
                 draw_line_between_points(face_nose_frame, nose_points[i], nose_points[i + 1], line_width=1)
@@ -415,7 +558,7 @@ def draw_body_only(frame_data, body_frame):
         pa = kp[a]
         pb = kp[b]
 
-        if pa["confidence"] < 0.1 or pb["confidence"] < 0.1:
+        if pa["confidence"] < CONFIDENCE_THRESHOLD or pb["confidence"] < CONFIDENCE_THRESHOLD:
             continue
 
         # Debljine linija za različite dijelove tijela
@@ -438,47 +581,14 @@ def draw_body_only(frame_data, body_frame):
                                 (pb["x"], pb["y"], 0), 
                                 line_width=line_width)
 
-# =====================================================
-# GLAVNA PETLJA ZA CRTANJE STICKMANA
-# =====================================================
-print("Drawing stickman animation...")
-
-for i, frame_data in enumerate(frames):
-    frame_number = i + 1
-    bpy.context.scene.frame_set(frame_number)
-    
-    # Stvori frameove za sve slojeve (brišući postojeće strokeove)
-    body_frame = get_or_create_frame(body_layer, frame_number)
-    head_frame = get_or_create_frame(head_layer, frame_number)
-    face_eyes_frame = get_or_create_frame(face_eyes_layer, frame_number)
-    face_eyebrows_frame = get_or_create_frame(face_eyebrows_layer, frame_number)
-    face_nose_frame = get_or_create_frame(face_nose_layer, frame_number)
-    ears_frame = get_or_create_frame(ears_layer, frame_number)
-    
-    # --- CRTANJE TIJELA 
-    draw_body_only(frame_data, body_frame)
-    
-    # --- CRTANJE VRATA (U BODY_LAYER) ---
-    draw_neck(frame_data, body_frame)
-    
-    # --- CRTANJE GLAVE ---
-    draw_head(frame_data, head_frame)
-    
-    # --- CRTANJE DETALJA LICA ---
-    draw_face_features(frame_data, head_frame, face_eyes_frame,
-                      face_eyebrows_frame, face_nose_frame, ears_frame)
-    
-    if frame_number % 25 == 0:
-        print(f"Processed frame {frame_number}/{len(frames)}")
-
-print("✅ Stickman animation complete")
-
 # =====================================================
 # CAMERA SETUP
 # =====================================================
-bpy.ops.object.camera_add(location=(0, 0, 10))  # Blíže za bolji prikaz
-cam = bpy.context.object
-cam.name = "Animation_Camera"
+cam = bpy.data.objects.get("Animation_Camera")
+if cam is None:
+    bpy.ops.object.camera_add(location=(0, 0, 10))  # Blíže za bolji prikaz
+    cam = bpy.context.object
+    cam.name = "Animation_Camera"
 cam.data.type = 'ORTHO'
 cam.data.ortho_scale = 1.5  # Manji scale za bolji prikaz
 bpy.context.scene.camera = cam
@@ -490,9 +600,12 @@ cam.rotation_euler = (0, 0, 0)
 # =====================================================
 # LIGHT SETUP
 # =====================================================
-# Dodaj svjetlo
-bpy.ops.object.light_add(type='SUN', location=(10, 10, 20))
-light = bpy.context.object
+# Dodaj svjetlo (u UPDATE_MODE koristi postojeće)
+light = bpy.data.objects.get("Animation_Light")
+if light is None:
+    bpy.ops.object.light_add(type='SUN', location=(10, 10, 20))
+    light = bpy.context.object
+    light.name = "Animation_Light"
 light.data.energy = 2.0
 
 # =====================================================
@@ -507,25 +620,263 @@ bpy.context.scene.render.film_transparent = True
 bpy.context.scene.world.color = (0, 0, 0)
 
 # =====================================================
-# OUTPUT INFO
-# =====================================================
-print("\n" + "="*50)
-print("🎬 STICKMAN ANIMATION READY")
-print("="*50)
-print("Layers created:")
-print("  • Body - Orange (tijelo + vrat)")
-print("  • Head - White (mala glava)")
-print("  • Face_Eyes - Blue (oči)")
-print("  • Face_Eyebrows - Brown (obrve)")
-print("  • Face_Nose - Red (nos)")
-print("  • Ears - White (uši na glavi)")
-print("\nControls:")
-print("  • ALT+A - Play animation")
-print("  • N - Toggle sidebar (to see layers)")
-print("  • Space - Play/Pause")
-print("="*50)
-print("\n💡 Promjene:")
-print("   - Uši su sada samo 5% izvan ruba glave (umjesto 20%)")
-print("   - Uši su manje (25% veličine glave umjesto 40%)")
-print("   - Ako su uši već izvan glave, povlače se na 5% izvan ruba")
-print("   - Uši su bliže glavi i izgledaju prirodnije")
\ No newline at end of file
+# GLAVNA PETLJA ZA CRTANJE STICKMANA
+# =====================================================
+layers = {
+    "Body": body_layer,
+    "Head": head_layer,
+    "Face_Eyes": face_eyes_layer,
+    "Face_Eyebrows": face_eyebrows_layer,
+    "Face_Nose": face_nose_layer,
+    "Ears": ears_layer,
+}
+
+# Postojeći frameovi po slojevima, da ne tražimo linearno za svaki frame
+existing_frames = {name: {f.frame_number: f for f in layer.frames}
+                   for name, layer in layers.items()}
+
+# Kreće od spremljenih fingerprintova, da prekinuto crtanje ne izgubi
+# informaciju o frameovima do kojih nije stiglo
+build_state = {
+    "fingerprints": {name: dict(stored_fingerprints.get(name, {})) for name in layers},
+    "redrawn_frames": 0,
+    "frames_read": 0,
+}
+
+def draw_frame(frame_number, frame_data):
+    """Precrtaj samo slojeve čiji se fingerprint promijenio (ili kojima frame fali)"""
+    key = str(frame_number)
+    
+    layer_frames = {}
+    new_fingerprints = {}
+    for name, layer in layers.items():
+        fingerprint = layer_fingerprint(frame_data, name)
+        
+        gp_frame = existing_frames[name].get(frame_number)
+        if gp_frame is not None and stored_fingerprints.get(name, {}).get(key) == fingerprint:
+            layer_frames[name] = None
+            continue
+        
+        # Dok sloj nije do kraja nacrtan, fingerprint je prazan - ako crtanje
+        # pukne, sljedeće pokretanje će ga sigurno precrtati
+        build_state["fingerprints"][name][key] = ""
+        new_fingerprints[name] = fingerprint
+        if gp_frame is None:
+            gp_frame = layer.frames.new(frame_number)
+        else:
+            gp_frame.strokes.clear()
+        layer_frames[name] = gp_frame
+    
+    if all(f is None for f in layer_frames.values()):
+        return False
+    
+    body_frame = layer_frames["Body"]
+    head_frame = layer_frames["Head"]
+    
+    if body_frame is not None:
+        # --- CRTANJE TIJELA 
+        draw_body_only(frame_data, body_frame)
+        
+        # --- CRTANJE VRATA (U BODY_LAYER) ---
+        draw_neck(frame_data, body_frame)
+    
+    # --- CRTANJE GLAVE ---
+    if head_frame is not None:
+        draw_head(frame_data, head_frame)
+    
+    # --- CRTANJE DETALJA LICA ---
+    draw_face_features(frame_data, head_frame, layer_frames["Face_Eyes"],
+                      layer_frames["Face_Eyebrows"], layer_frames["Face_Nose"],
+                      layer_frames["Ears"])
+    
+    for name, fingerprint in new_fingerprints.items():
+        build_state["fingerprints"][name][key] = fingerprint
+    return True
+
+def build_steps():
+    """Crtaj frame po frame; nakon svakog vraća broj frame-a."""
+    scene = bpy.context.scene
+    for i, frame_data in enumerate(iter_animation_frames(json_path)):
+        frame_number = i + 1
+        if draw_frame(frame_number, frame_data):
+            build_state["redrawn_frames"] += 1
+        build_state["frames_read"] = frame_number
+        
+        if frame_number > scene.frame_end:
+            scene.frame_end = frame_number
+        
+        if frame_number % 25 == 0:
+            print(f"Processed frame {frame_number}/{total_frames}")
+        
+        yield frame_number
+
+def finish_build(cancelled=False):
+    """Spremi fingerprintove i (ako crtanje nije prekinuto) počisti višak frameova."""
+    frames_read = build_state["frames_read"]
+    fingerprints = build_state["fingerprints"]
+    
+    if not cancelled:
+        # Obriši frameove koji su višak ako je novi klip kraći
+        for name, layer in layers.items():
+            for frame_number, gp_frame in existing_frames[name].items():
+                if frame_number > frames_read:
+                    layer.frames.remove(gp_frame)
+            fingerprints[name] = {key: value for key, value in fingerprints[name].items()
+                                  if int(key) <= frames_read}
+        bpy.context.scene.frame_end = max(frames_read, 1)
+    
+    gp[FINGERPRINT_PROP] = json.dumps(fingerprints)
+    print(f"Redrawn frames: {build_state['redrawn_frames']}/{total_frames}")
+    
+    if cancelled:
+        print(f"⚠️ Stickman animation cancelled at frame {frames_read}/{total_frames}")
+        return
+    
+    print("✅ Stickman animation complete")
+    
+    print("\n" + "="*50)
+    print("🎬 STICKMAN ANIMATION READY")
+    print("="*50)
+    print("Layers created:")
+    print("  • Body - Orange (tijelo + vrat)")
+    print("  • Head - White (mala glava)")
+    print("  • Face_Eyes - Blue (oči)")
+    print("  • Face_Eyebrows - Brown (obrve)")
+    print("  • Face_Nose - Red (nos)")
+    print("  • Ears - White (uši na glavi)")
+    print("\nControls:")
+    print("  • ALT+A - Play animation")
+    print("  • N - Toggle sidebar (to see layers)")
+    print("  • Space - Play/Pause")
+    print("="*50)
+    print("\n💡 Promjene:")
+    print("   - Uši su sada samo 5% izvan ruba glave (umjesto 20%)")
+    print("   - Uši su manje (25% veličine glave umjesto 40%)")
+    print("   - Ako su uši već izvan glave, povlače se na 5% izvan ruba")
+    print("   - Uši su bliže glavi i izgledaju prirodnije")
+
+# =====================================================
+# MODALNI OPERATOR (CRTANJE U DIJELOVIMA)
+# =====================================================
+def gp_is_valid():
+    """Postoji li još isti Stickman_Animation objekt kojeg crtamo."""
+    try:
+        return bpy.data.objects.get(GP_OBJECT_NAME) == gp and gp.data is not None
+    except ReferenceError:
+        return False
+
+def _invalidate_build(*args):
+    # Undo/redo ponovno učitava podatke pa reference na slojeve/frameove više ne vrijede
+    STICKMAN_OT_build_animation.invalidated = True
+
+def _reset_build(*args):
+    # Učitavanje druge datoteke ugasi modalni operator bez poziva stop()
+    STICKMAN_OT_build_animation.is_running = False
+    _remove_build_handlers()
+
+BUILD_HANDLERS = [
+    (bpy.app.handlers.undo_post, _invalidate_build),
+    (bpy.app.handlers.redo_post, _invalidate_build),
+    (bpy.app.handlers.load_pre, _reset_build),
+]
+
+def _remove_build_handlers():
+    for handlers, func in BUILD_HANDLERS:
+        if func in handlers:
+            handlers.remove(func)
+
+# Ctrl+Z / Ctrl+Shift+Z / Ctrl+Y se gutaju dok crtanje traje
+UNDO_KEYS = {'Z', 'Y'}
+
+class STICKMAN_OT_build_animation(bpy.types.Operator):
+    """Crtaj stickman animaciju u dijelovima (ESC prekida, nacrtano ostaje)"""
+    bl_idname = "stickman.build_animation"
+    bl_label = "Build Stickman Animation"
+    
+    is_running = False
+    invalidated = False
+    
+    _timer = None
+    _steps = None
+    
+    def invoke(self, context, event):
+        cls = type(self)
+        cls.is_running = True
+        cls.invalidated = False
+        for handlers, func in BUILD_HANDLERS:
+            handlers.append(func)
+        
+        wm = context.window_manager
+        self._steps = build_steps()
+        wm.progress_begin(0, max(total_frames, 1))
+        self._timer = wm.event_timer_add(TIMER_INTERVAL, window=context.window)
+        wm.modal_handler_add(self)
+        return {'RUNNING_MODAL'}
+    
+    def modal(self, context, event):
+        if event.type == 'ESC' and event.value == 'PRESS':
+            return self.stop(context, cancelled=True)
+        
+        if event.type in UNDO_KEYS and (event.ctrl or event.oskey):
+            return {'RUNNING_MODAL'}
+        
+        if event.type != 'TIMER':
+            return {'PASS_THROUGH'}
+        
+        if type(self).invalidated or not gp_is_valid():
+            self.stop(context, cancelled=True)
+            self.report({'WARNING'}, "Stickman build cancelled: scene changed while drawing")
+            return {'CANCELLED'}
+        
+        # Crtaj dok ne potrošimo vremenski budžet, pa vrati kontrolu UI-u
+        deadline = time.perf_counter() + CHUNK_TIME_BUDGET
+        try:
+            for frame_number in self._steps:
+                if time.perf_counter() >= deadline:
+                    break
+            else:
+                return self.stop(context, cancelled=False)
+        except Exception as e:
+            self.stop(context, cancelled=True)
+            self.report({'ERROR'}, f"Stickman build failed: {e}")
+            return {'CANCELLED'}
+        
+        context.window_manager.progress_update(frame_number)
+        context.workspace.status_text_set(
+            f"Drawing stickman: {frame_number}/{total_frames} (ESC to cancel)")
+        return {'RUNNING_MODAL'}
+    
+    def stop(self, context, cancelled):
+        cls = type(self)
+        cls.is_running = False
+        _remove_build_handlers()
+        
+        wm = context.window_manager
+        wm.event_timer_remove(self._timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        self._steps.close()
+        
+        # Nakon undo-a ili brisanja objekta nema gdje spremiti fingerprintove
+        if not cls.invalidated and gp_is_valid():
+            finish_build(cancelled)
+        else:
+            print("⚠️ Stickman animation cancelled, scene changed while drawing")
+        return {'CANCELLED'} if cancelled else {'FINISHED'}
+
+# =====================================================
+# POKRETANJE
+# =====================================================
+print("Drawing stickman animation...")
+
+if BUILD_ASYNC and not bpy.app.background:
+    # Ponovno pokretanje skripte zamijeni prethodno registriran operator
+    # (na vrhu skripte je provjereno da on trenutno ne crta)
+    if running_operator is not None:
+        bpy.utils.unregister_class(running_operator)
+    bpy.utils.register_class(STICKMAN_OT_build_animation)
+    bpy.ops.stickman.build_animation('INVOKE_DEFAULT')
+else:
+    for _ in build_steps():
+        pass
+    finish_build()
\ No newline at end of file
@@ -1,9 +1,118 @@
 import json
 import os
+import shutil
+import textwrap
+import time
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def convert_openpose_to_blender_2d(input_dir, output_file="animation_data.json", frame_rate=30):
+def _read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def prefetch_frame_files(paths, lookahead=16, num_threads=4, stats=None):
+    """Čitaj datoteke unaprijed na thread poolu i vraćaj ih redom.
+
+    Vraća (path, raw_bytes, error) za svaku datoteku, u istom redoslijedu kao paths.
+    Najviše `lookahead` datoteka je u letu odjednom. Ako je zadan `stats` dict,
+    u stats["io_wait"] se zbraja vrijeme (u sekundama) koje je petlja čekala na disk.
+    """
+    if stats is not None:
+        stats.setdefault("io_wait", 0.0)
+
+    lookahead = max(1, lookahead)
+    paths = iter(paths)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=max(1, num_threads)) as pool:
+        for path in paths:
+            pending.append((path, pool.submit(_read_bytes, path)))
+            if len(pending) >= lookahead:
+                break
+
+        while pending:
+            path, future = pending.popleft()
+
+            start = time.perf_counter()
+            try:
+                raw, error = future.result(), None
+            except Exception as e:
+                raw, error = None, e
+            if stats is not None:
+                stats["io_wait"] += time.perf_counter() - start
+
+            # Dopuni prozor prije nego što predamo podatke parseru
+            next_path = next(paths, None)
+            if next_path is not None:
+                pending.append((next_path, pool.submit(_read_bytes, next_path)))
+
+            yield path, raw, error
+
+class StreamingAnimationWriter:
+    """Zapisuje frameove u JSON odmah kako se konvertiraju.
+
+    Frameovi idu u privremenu datoteku pa se u memoriji drži samo brojač.
+    finish() na kraju zapiše {"metadata", "frames"} u istom obliku kao
+    json.dump(..., indent=2), s total_frames i has_face_data izračunatima
+    iz zapisanih frameova. Koristi se kao context manager: ako konverzija
+    pukne (ili Ctrl+C) prije finish(), privremena datoteka se briše.
+    """
+
+    def __init__(self, output_file):
+        self.output_file = output_file
+        self.frames_file = output_file + ".frames.tmp"
+        self._frames_f = open(self.frames_file, 'w')
+        self.total_frames = 0
+        self.face_frames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.abort()
+        return False
+
+    def abort(self):
+        """Zatvori i obriši privremenu datoteku (ako još postoji)."""
+        self._frames_f.close()
+        if os.path.exists(self.frames_file):
+            os.remove(self.frames_file)
+
+    def write_frame(self, frame):
+        if self.total_frames:
+            self._frames_f.write(",\n")
+        self._frames_f.write(textwrap.indent(json.dumps(frame, indent=2), "    "))
+        self.total_frames += 1
+        if frame["has_face"]:
+            self.face_frames += 1
+
+    def finish(self, metadata):
+        self._frames_f.close()
+
+        metadata = {
+            "total_frames": self.total_frames,
+            **metadata,
+            "has_face_data": self.face_frames > 0
+        }
+
+        try:
+            with open(self.output_file, 'w') as f:
+                f.write('{\n  "metadata": ')
+                f.write(textwrap.indent(json.dumps(metadata, indent=2), "  ").lstrip())
+                if self.total_frames:
+                    f.write(',\n  "frames": [\n')
+                    with open(self.frames_file, 'r') as frames_f:
+                        shutil.copyfileobj(frames_f, f)
+                    f.write('\n  ]\n}')
+                else:
+                    f.write(',\n  "frames": []\n}')
+        finally:
+            self.abort()
+
+def convert_openpose_to_blender_2d(input_dir, output_file="animation_data.json", frame_rate=30,
+                                   prefetch_depth=16, io_threads=4):
     JOINT_NAMES = [
         "Nose", "Neck", "RShoulder", "RElbow", "RWrist",
         "LShoulder", "LElbow", "LWrist", "MidHip", "RHip",
@@ -69,144 +178,145 @@ def convert_openpose_to_blender_2d(input_dir, output_file="animation_data.json",
     
     print(f"Pronađeno {len(json_files)} frameova")
     
-    frames_data = []
+    # Za forward-fill treba samo zadnji frame, ostali odmah idu u datoteku
+    with StreamingAnimationWriter(output_file) as writer:
+        prev_frame = None
     
-    for i, json_file in enumerate(json_files):
-        frame_path = os.path.join(input_dir, json_file)
-        
-        try:
-            with open(frame_path, 'r') as f:
-                data = json.load(f)
+        io_stats = {}
+        frame_paths = [os.path.join(input_dir, f) for f in json_files]
+        prefetched = prefetch_frame_files(frame_paths, lookahead=prefetch_depth,
+                                          num_threads=io_threads, stats=io_stats)
+    
+        for i, (json_file, (frame_path, raw, read_error)) in enumerate(zip(json_files, prefetched)):
+            try:
+                if read_error is not None:
+                    raise read_error
+                data = json.loads(raw)
                 
-            frame_keypoints = {}
-            has_face_data = False
+                frame_keypoints = {}
+                has_face_data = False
             
-            if 'people' in data and len(data['people']) > 0:
-                person = data['people'][0]
-                keypoints_array = np.array(person['pose_keypoints_2d']).reshape(-1, 3)
+                if 'people' in data and len(data['people']) > 0:
+                    person = data['people'][0]
+                    keypoints_array = np.array(person['pose_keypoints_2d']).reshape(-1, 3)
                 
-                for joint_name, idx in SIMPLIFIED_JOINTS.items():
-                    x, y, confidence = keypoints_array[idx]
+                    for joint_name, idx in SIMPLIFIED_JOINTS.items():
+                        x, y, confidence = keypoints_array[idx]
                     
-                    normalized_x = (x - 320) / 500
-                    normalized_y = (480 - y) / 500  
+                        normalized_x = (x - 320) / 500
+                        normalized_y = (480 - y) / 500  
                     
-                    if confidence > 0.1:
-                        frame_keypoints[joint_name] = {
-                            "x": float(normalized_x),
-                            "y": float(normalized_y),
-                            "confidence": float(confidence),
-                            "type": "body"
-                        }
-                    else:
-                        if frames_data and joint_name in frames_data[-1]["keypoints"]:
-                            frame_keypoints[joint_name] = frames_data[-1]["keypoints"][joint_name]
-                        else:
+                        if confidence > 0.1:
                             frame_keypoints[joint_name] = {
-                                "x": 0.0,
-                                "y": 0.0,
-                                "confidence": 0.0,
+                                "x": float(normalized_x),
+                                "y": float(normalized_y),
+                                "confidence": float(confidence),
                                 "type": "body"
                             }
+                        else:
+                            if prev_frame and joint_name in prev_frame["keypoints"]:
+                                frame_keypoints[joint_name] = prev_frame["keypoints"][joint_name]
+                            else:
+                                frame_keypoints[joint_name] = {
+                                    "x": 0.0,
+                                    "y": 0.0,
+                                    "confidence": 0.0,
+                                    "type": "body"
+                                }
                 
-                if 'face_keypoints_2d' in person and person['face_keypoints_2d']:
-                    has_face_data = True
-                    face_points = np.array(person['face_keypoints_2d']).reshape(-1, 3)
+                    if 'face_keypoints_2d' in person and person['face_keypoints_2d']:
+                        has_face_data = True
+                        face_points = np.array(person['face_keypoints_2d']).reshape(-1, 3)
                     
-                    face_indices = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 26, 25, 24, 23, 22, 21, 20, 19, 18, 17]  # Kontura lica
+                        face_indices = [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 26, 25, 24, 23, 22, 21, 20, 19, 18, 17]  # Kontura lica
                     
-                    for j, idx in enumerate(face_indices):
-                        if idx < len(face_points):
-                            x, y, confidence = face_points[idx]
-                            normalized_x = (x - 320) / 500
-                            normalized_y = (480 - y) / 500
+                        for j, idx in enumerate(face_indices):
+                            if idx < len(face_points):
+                                x, y, confidence = face_points[idx]
+                                normalized_x = (x - 320) / 500
+                                normalized_y = (480 - y) / 500
                             
-                            if confidence > 0.1:
-                                frame_keypoints[f"Face_{j}"] = {
-                                    "x": float(normalized_x),
-                                    "y": float(normalized_y),
-                                    "confidence": float(confidence),
-                                    "type": "face"
-                                }
+                                if confidence > 0.1:
+                                    frame_keypoints[f"Face_{j}"] = {
+                                        "x": float(normalized_x),
+                                        "y": float(normalized_y),
+                                        "confidence": float(confidence),
+                                        "type": "face"
+                                    }
                     
-                    inner_face_indices = [27, 28, 29, 30, 31, 32, 33, 34, 35] 
-                    for j, idx in enumerate(inner_face_indices):
-                        if idx < len(face_points):
-                            x, y, confidence = face_points[idx]
-                            normalized_x = (x - 320) / 500
-                            normalized_y = (480 - y) / 500
+                        inner_face_indices = [27, 28, 29, 30, 31, 32, 33, 34, 35] 
+                        for j, idx in enumerate(inner_face_indices):
+                            if idx < len(face_points):
+                                x, y, confidence = face_points[idx]
+                                normalized_x = (x - 320) / 500
+                                normalized_y = (480 - y) / 500
                             
-                            if confidence > 0.1:
-                                frame_keypoints[f"Face_nose_{j}"] = {
-                                    "x": float(normalized_x),
-                                    "y": float(normalized_y),
-                                    "confidence": float(confidence),
-                                    "type": "face"
-                                }
-            else:
-                if frames_data:
-                    frame_keypoints = frames_data[-1]["keypoints"].copy()
+                                if confidence > 0.1:
+                                    frame_keypoints[f"Face_nose_{j}"] = {
+                                        "x": float(normalized_x),
+                                        "y": float(normalized_y),
+                                        "confidence": float(confidence),
+                                        "type": "face"
+                                    }
                 else:
-                    frame_keypoints = {joint: {"x": 0.0, "y": 0.0, "confidence": 0.0, "type": "body"} 
-                                     for joint in SIMPLIFIED_JOINTS.keys()}
+                    if prev_frame:
+                        frame_keypoints = prev_frame["keypoints"].copy()
+                    else:
+                        frame_keypoints = {joint: {"x": 0.0, "y": 0.0, "confidence": 0.0, "type": "body"} 
+                                         for joint in SIMPLIFIED_JOINTS.keys()}
             
-            frames_data.append({
-                "frame": i,
-                "keypoints": frame_keypoints,
-                "has_face": has_face_data
-            })
+                prev_frame = {
+                    "frame": i,
+                    "keypoints": frame_keypoints,
+                    "has_face": has_face_data
+                }
+                writer.write_frame(prev_frame)
             
-            if (i + 1) % 50 == 0:
-                print(f"  Obradio {i + 1}/{len(json_files)} frameova")
-                if has_face_data:
-                    print(f"    (ima podatke o licu)")
+                if (i + 1) % 50 == 0:
+                    print(f"  Obradio {i + 1}/{len(json_files)} frameova")
+                    if has_face_data:
+                        print(f"    (ima podatke o licu)")
                 
-        except Exception as e:
-            print(f"Greška pri čitanju {json_file}: {e}")
-            if frames_data:
-                frames_data.append(frames_data[-1].copy())
-            else:
-                frames_data.append({
-                    "frame": i,
-                    "keypoints": {joint: {"x": 0.0, "y": 0.0, "confidence": 0.0, "type": "body"} 
-                                 for joint in SIMPLIFIED_JOINTS.keys()},
-                    "has_face": False
-                })
+            except Exception as e:
+                print(f"Greška pri čitanju {json_file}: {e}")
+                if prev_frame:
+                    prev_frame = prev_frame.copy()
+                else:
+                    prev_frame = {
+                        "frame": i,
+                        "keypoints": {joint: {"x": 0.0, "y": 0.0, "confidence": 0.0, "type": "body"} 
+                                     for joint in SIMPLIFIED_JOINTS.keys()},
+                        "has_face": False
+                    }
+                writer.write_frame(prev_frame)
     
-    face_connections = []
-    face_point_count = 27  
+        face_connections = []
+        face_point_count = 27  
     
-    for i in range(face_point_count - 1):
-        face_connections.append((f"Face_{i}", f"Face_{i + 1}"))
+        for i in range(face_point_count - 1):
+            face_connections.append((f"Face_{i}", f"Face_{i + 1}"))
 
-    face_connections.append((f"Face_{face_point_count - 1}", "Face_0"))
+        face_connections.append((f"Face_{face_point_count - 1}", "Face_0"))
     
-    nose_connections = []
-    for i in range(8):  # Za nos
-        nose_connections.append((f"Face_nose_{i}", f"Face_nose_{i + 1}"))
+        nose_connections = []
+        for i in range(8):  # Za nos
+            nose_connections.append((f"Face_nose_{i}", f"Face_nose_{i + 1}"))
     
-    all_connections = BONE_CONNECTIONS + face_connections + nose_connections
+        all_connections = BONE_CONNECTIONS + face_connections + nose_connections
     
-    output_data = {
-        "metadata": {
-            "total_frames": len(frames_data),
+        # total_frames i has_face_data dodaje writer
+        writer.finish({
             "fps": frame_rate,
             "joints": list(SIMPLIFIED_JOINTS.keys()),
-            "bone_connections": all_connections,
-            "has_face_data": any(frame["has_face"] for frame in frames_data)
-        },
-        "frames": frames_data
-    }
-    
-    with open(output_file, 'w') as f:
-        json.dump(output_data, f, indent=2)
+            "bone_connections": all_connections
+        })
     
     print(f"Podaci spremljeni u: {output_file}")
-    print(f"Ukupno frameova: {len(frames_data)}")
+    print(f"Ukupno frameova: {writer.total_frames}")
+    print(f"Čekanje na čitanje datoteka: {io_stats['io_wait']:.2f} s")
     
-    face_frames = sum(1 for frame in frames_data if frame["has_face"])
-    if face_frames > 0:
-        print(f"Frameova s podacima o licu: {face_frames}")
+    if writer.face_frames > 0:
+        print(f"Frameova s podacima o licu: {writer.face_frames}")
     
 if __name__ == "__main__":
     INPUT_DIR = "openpose_json/video10"